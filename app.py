@@ -6,19 +6,23 @@
 
 import os
 import time
-import json
 import re
 import io
 import logging
-import gc
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
+import uuid
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+import aiohttp
+import orjson
 import pandas as pd
 import streamlit as st
-from urllib.parse import urlparse
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from urllib.parse import urlparse, urlsplit, urlunsplit
+from extraction import ExtractOptions, parse_and_extract
 
 # Logging setup
 log_filename = f"scraper_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
@@ -28,19 +32,42 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# HTTP Session with retry logic
-session = requests.Session()
-retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504, 429])
-adapter = HTTPAdapter(max_retries=retries)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
+# HTTP request settings: retries back off exponentially (1s, 2s, 4s) on connection errors and these
+# statuses, waiting longer when the response's Retry-After asks for it
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+FETCH_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 1
+RETRY_STATUSES = frozenset({502, 503, 504, 429})
+MAX_RETRY_AFTER = 60  # a longer Retry-After fails the URL instead of stalling the run
+
+# Async fetch settings
+FETCH_TIMEOUT = 15
+MAX_CONNECTIONS = 20
+PER_HOST_CONCURRENCY = 4
+HOST_MIN_INTERVAL = 1.0  # seconds between request starts to the same host
+PROCESS_POOL_MIN_PAGES = 8  # smaller batches are parsed in-process; spawning workers costs more
+LOG_FLUSH_SECONDS = 0.5
+LOG_TAIL_LINES = 200
+MAX_BODY_BYTES = 10_000_000  # larger responses are abandoned instead of being held in memory
+BODY_CHUNK_BYTES = 65536
+# FETCH_TIMEOUT bounds connecting and each read, like requests' timeout, not the whole request:
+# time spent queued for a free pooled connection must not count against it
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=FETCH_TIMEOUT, sock_read=FETCH_TIMEOUT)
+
+# Export settings: past this many rows Excel generation is too slow, so only CSV is offered
+EXCEL_MAX_ROWS = 100_000
+EXCEL_CHUNK_ROWS = 5000
 
 # Checkpoint system
+# The file keeps readable URLs; in memory only each URL's hash is held, which keeps
+# large checkpoints small (hashes are only compared within this process)
 checkpoint_file = "scraped_urls.txt"
 already_scraped = set()
-if os.path.exists(checkpoint_file):
+try:
     with open(checkpoint_file, "r") as f:
-        already_scraped = set(f.read().splitlines())
+        already_scraped = {hash(line.rstrip("\n")) for line in f}
+except FileNotFoundError:
+    pass
 
 st.set_page_config(page_title="Government Service Web Scraper", layout="wide")
 
@@ -60,6 +87,10 @@ if 'url_data_map' not in st.session_state:
 if 'is_scraping' not in st.session_state:
     st.session_state.is_scraping = False
 
+# Identifies this session's results in the cache, which is shared by every session in the process
+if 'session_token' not in st.session_state:
+    st.session_state.session_token = uuid.uuid4().hex
+
 st.title("Iystream Service Web Scraper")
 # Safely initialize session state variables# URL input
 st.subheader("URL Input")
@@ -72,21 +103,23 @@ if uploaded_file is not None:
     # Read the file based on type
     if uploaded_file.name.endswith('.csv'):
         try:
-            df = pd.read_csv(uploaded_file)
+            # Read just the header row first so only the URL column gets parsed
+            columns = pd.read_csv(uploaded_file, nrows=0).columns
+            
             # Try to find a column that might contain URLs
             url_col = None
-            for col in df.columns:
+            for col in columns:
                 if col.lower() in ['url', 'link', 'website', 'address']:
                     url_col = col
                     break
             
-            if url_col:
-                urls_from_file = df[url_col].tolist()
-                url_text = "\n".join([url for url in urls_from_file if isinstance(url, str) and url.strip()])
-            else:
+            if url_col is None:
                 # Just take the first column
-                urls_from_file = df.iloc[:, 0].tolist()
-                url_text = "\n".join([url for url in urls_from_file if isinstance(url, str) and url.strip()])
+                url_col = columns[0]
+            
+            uploaded_file.seek(0)
+            urls_from_file = pd.read_csv(uploaded_file, usecols=[url_col], dtype=str, engine='c')[url_col].tolist()
+            url_text = "\n".join([url for url in urls_from_file if isinstance(url, str) and url.strip()])
         except Exception as e:
             st.error(f"Error reading CSV file: {str(e)}")
     else:
@@ -113,7 +146,7 @@ with st.expander("Advanced Options"):
     st.subheader("Excel Export Options")
     excel_option = st.radio(
         "How to organize Excel sheets:",
-        options=["One sheet per URL", "All URLs in one sheet"]
+        options=["One sheet per URL", "All URLs in one sheet", "Parquet (fastest)"]
     )
 
 # Setup for storing results
@@ -129,60 +162,29 @@ if 'is_scraping' not in st.session_state:
 
 
 
-def extract_section_content(soup):
-    import re
-
-    section_titles = [
-        "Introduction",
-        "What you'll need?",
-        "How to get the service?",
-        "Who's eligible?",
-        "Payment / Charges",
-        "Need help?",
-        "Things to keep in mind",
-        "Required Documents",
-        "Online Registration",
-    ]
-
-    sections = {}
-
-    for tag in soup.find_all("h5"):
-        title = tag.get_text(strip=True).strip(":")
-        if title not in section_titles:
-            continue
-
-        button = tag.find_parent("button")
-        if not button or not button.has_attr("data-target"):
-            continue
-
-        target_id = button["data-target"].strip("#")
-        content_div = soup.find("div", {"id": target_id})
-        if not content_div:
-            continue
-
-        for junk in content_div.find_all(["script", "style", "noscript"]):
-            junk.decompose()
-
-        raw_text = content_div.get_text(separator="\n", strip=True)
-        lines = raw_text.split("\n")
-        if lines and lines[0].strip() == title:
-            lines = lines[1:]
-        final_content = "\n".join(lines).strip()
-        if final_content:
-            sections[title] = final_content
-
-    return sections
-
-
-
-
-
+# Canonical form of an input URL, so case/scheme/tracking variants of one page are scraped once:
+# https:// added when no scheme is given, host lowercased, trailing '/', utm_* parameters and
+# fragment dropped. The rest of the URL is kept byte for byte; the query is only rebuilt
+# from its raw pairs when a utm_* pair is removed.
+def normalize_url(url):
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+    parts = urlsplit(url)
+    userinfo, at, host = parts.netloc.rpartition('@')
+    query = parts.query
+    pairs = query.split('&')
+    kept = [pair for pair in pairs if not pair.lower().startswith('utm_')]
+    if len(kept) < len(pairs):
+        query = '&'.join(kept)
+    return urlunsplit((parts.scheme, userinfo + at + host.lower(), parts.path.rstrip('/'), query, ''))
 
+# Characters Excel does not allow in sheet names
+_SHEET_SANITIZE_RE = re.compile(r'[\[\]:*?/\\]')
 
 # Function to clean URLs for sheet names
+@lru_cache(maxsize=4096)
 def clean_url_for_sheet_name(url):
     # Extract domain and path for a cleaner name
-    from urllib.parse import urlparse
     parsed = urlparse(url)
     domain = parsed.netloc.split('.')
     domain = domain[-2] if len(domain) > 1 else domain[0]  # Get the main domain name
@@ -194,221 +196,217 @@ def clean_url_for_sheet_name(url):
     # Combine and clean the name
     sheet_name = f"{domain}-{path}"
     # Remove invalid Excel sheet name characters
-    sheet_name = re.sub(r'[\[\]:*?/\\]', '-', sheet_name)
+    sheet_name = _SHEET_SANITIZE_RE.sub('-', sheet_name)
     # Ensure it's not too long (Excel has a 31 character limit)
     if len(sheet_name) > 31:
         sheet_name = sheet_name[:31]
     
     return sheet_name
 
+# Be nice to servers: space out request starts to the same host by HOST_MIN_INTERVAL,
+# sleeping only when that host was hit too recently (other hosts are not held up)
+async def wait_for_host(host, next_start):
+    now = asyncio.get_running_loop().time()
+    start = max(now, next_start.get(host, now))
+    next_start[host] = start + HOST_MIN_INTERVAL
+    if start > now:
+        await asyncio.sleep(start - now)
+
+# Seconds a response's Retry-After header (delay in seconds or an HTTP date) asks us to wait; 0 if absent or invalid
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+# Fetch a single page, retrying connection errors and retryable statuses
+async def fetch(client, url, next_start):
+    host = urlparse(url).netloc
+    retry_after = 0
+    for attempt in range(FETCH_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(max(RETRY_BACKOFF_FACTOR * 2 ** (attempt - 1), retry_after))
+            retry_after = 0
+        await wait_for_host(host, next_start)
+        try:
+            async with client.get(url) as response:
+                if response.status in RETRY_STATUSES and attempt < FETCH_RETRIES:
+                    retry_after = retry_after_seconds(response)
+                    if retry_after <= MAX_RETRY_AFTER:
+                        continue
+                response.raise_for_status()
+                # Stream the (already decompressed) body and give up once it passes MAX_BODY_BYTES
+                if response.content_length and response.content_length > MAX_BODY_BYTES:
+                    raise RuntimeError(f"Response body larger than {MAX_BODY_BYTES} bytes")
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(BODY_CHUNK_BYTES):
+                    body += chunk
+                    if len(body) > MAX_BODY_BYTES:
+                        raise RuntimeError(f"Response body larger than {MAX_BODY_BYTES} bytes")
+                return bytes(body)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == FETCH_RETRIES:
+                raise
+
+# Result row for a URL that could not be fetched or parsed
+def error_row(url, error):
+    # Some errors (aiohttp timeouts) have an empty message; name the exception instead
+    return {
+        "URL": url, 
+        "Title": "", 
+        "Status": f"Error: {str(error) or type(error).__name__}"
+    }
+
+# Fetch pages concurrently, bounded overall and per host by the connector, and parse each one
+# as soon as its fetch finishes (in the process pool when one is given).
+# handle_result(i, data) is called in completion order, so only pages in flight are held in memory.
+async def scrape_pages(urls, options, executor, handle_result):
+    loop = asyncio.get_running_loop()
+    next_start = {}
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=PER_HOST_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT},
+                                     timeout=REQUEST_TIMEOUT) as client:
+        async def scrape_one(i, url):
+            try:
+                page = await fetch(client, url, next_start)
+                if executor:
+                    data = await loop.run_in_executor(executor, parse_and_extract, url, page, options)
+                else:
+                    data = parse_and_extract(url, page, options)
+            except Exception as e:
+                # Failed fetches, and pages lost to a dead worker (BrokenProcessPool), become error rows
+                data = error_row(url, e)
+            return i, data
+        
+        for next_done in asyncio.as_completed([scrape_one(i, url) for i, url in enumerate(urls)]):
+            handle_result(*await next_done)
+
 # Scraping function
-def scrape_urls(urls):
-    all_data = []  # List to hold all scraped data
-    url_data_map = {}  # Dictionary to map URLs to their scraped data
-    
+# Results are handed back through on_result(position, data) as each URL finishes,
+# with the URL's position in urls; they arrive in completion order, not input order
+def scrape_urls(urls, on_result):
     progress_text = st.empty()
     progress_bar = st.progress(0)
     log_container = st.container()
     
-    for i, url in enumerate(urls):
-        progress_text.text(f"Processing {i+1}/{len(urls)}: {url}")
-        
-        # Check URL format
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        
-        try:
-            # Fetch and parse page
-            response = requests.get(url, headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract data
-            data = {"URL": url}
+    # Skip URLs already recorded in the checkpoint file
+    positions = [position for position, url in enumerate(urls) if hash(url) not in already_scraped]
+    if len(positions) < len(urls):
+        with log_container:
+            st.info(f"Skipping {len(urls) - len(positions)} already scraped URLs")
+    urls = [urls[position] for position in positions]
+    
+    progress_text.text(f"Fetching {len(urls)} URLs...")
+    
+    # Log lines are collected and flushed in batches rather than rendered per URL
+    log_area = log_container.empty()
+    log_lines = []
+    last_flush = time.monotonic()
+    last_percent = 0
+    finished = 0
+    
+    # Parse pages across CPU cores unless the batch is small
+    options = ExtractOptions(title_selector, extract_meta, extract_links, extract_images, extract_sections)
+    use_pool = len(urls) >= PROCESS_POOL_MIN_PAGES
+    
+    with open(checkpoint_file, "a", buffering=1) as checkpoint:
+        def record_result(i, data):
+            nonlocal last_flush, last_percent, finished
+            url = urls[i]
+            finished += 1
+            on_result(positions[i], data)
             
-            # Title
-            title_elem = soup.select_one(title_selector)
-            if title_elem:
-                data["Title"] = title_elem.get_text(strip=True)
+            # Record completed URLs straight away so an interrupted run can resume
+            if data["Status"] == "completed":
+                checkpoint.write(url + "\n")
+                already_scraped.add(hash(url))
+                log_lines.append(f"✓ Successfully scraped: {data['Title'] or url}")
             else:
-                data["Title"] = ""
-            
-            # Count H1 tags
-            h1_count = len(soup.find_all('h1'))
-            data["H1 Count"] = h1_count
-            
-            # Count links
-            if extract_links:
-                links_count = len(soup.find_all('a'))
-                data["Links"] = links_count
-            
-            # Count images
-            if extract_images:
-                images_count = len(soup.find_all('img'))
-                data["Images"] = images_count
-            
-            # Extract meta tags
-            if extract_meta:
-                meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-                if meta_keywords:
-                    data["Meta Keywords"] = meta_keywords.get('content', '')
-                
-                meta_desc = soup.find('meta', attrs={'name': 'description'})
-                if meta_desc:
-                    data["Meta Description"] = meta_desc.get('content', '')
-            
-            # Extract section content for government services
-            if extract_sections:
-                sections = extract_section_content(soup)
-                
-                # Add sections as columns
-                for section_name, content in sections.items():
-                    column_name = f"Section: {section_name}"
-                    data[column_name] = content
-                
-                # Store full sections data as JSON
-                data["All Sections"] = json.dumps(sections)
-            
-            # Required documents
-            documents_list = []
-            for list_item in soup.find_all('li'):
-                text = list_item.get_text(strip=True)
-                if any(doc_word in text.lower() for doc_word in ['copy', 'document', 'certificate', 'id', 'passport']):
-                    documents_list.append(text)
-            
-            if documents_list:
-                data["Required Documents"] = "\n".join(documents_list)
-            
-            # Eligibility
-            eligibility_list = []
-            eligible_section = soup.find(string=re.compile("Who's eligible?", re.IGNORECASE))
-            if eligible_section:
-                for parent in eligible_section.parents:
-                    if parent.name in ['div', 'section']:
-                        for li in parent.find_all('li'):
-                            eligibility_list.append(li.get_text(strip=True))
-                        break
-            
-            if eligibility_list:
-                data["Eligibility Criteria"] = "\n".join(eligibility_list)
-            
-            # Check if registration is available online
-            online_indicators = ['register online', 'available online', 'online service', 'apply online']
-            data["Online Registration"] = "No"
-            for indicator in online_indicators:
-                if indicator in response.text.lower():
-                    data["Online Registration"] = "Yes"
-                    break
-            
-            # Costs/fees
-            payment_section = soup.find(string=re.compile("Payment|Charges|Fee", re.IGNORECASE))
-            if payment_section:
-                for parent in payment_section.parents:
-                    if parent.name in ['div', 'section']:
-                        fee_text = parent.get_text(strip=True)
-                        if "free" in fee_text.lower() or "no charge" in fee_text.lower():
-                            data["Fee"] = "Free"
-                        else:
-                            # Try to extract fee amount
-                            fee_match = re.search(r'RM\s*(\d+(?:\.\d+)?)', fee_text)
-                            if fee_match:
-                                data["Fee"] = f"RM {fee_match.group(1)}"
-                            else:
-                                data["Fee"] = fee_text
-                        break
+                log_lines.append(f"✗ Error scraping {url}: {data['Status'].removeprefix('Error: ')}")
             
-            data["Status"] = "completed"
+            # Refresh the status and log tail at most every LOG_FLUSH_SECONDS, and after the last URL
+            now = time.monotonic()
+            if now - last_flush >= LOG_FLUSH_SECONDS or finished == len(urls):
+                progress_text.text(f"Processing {finished}/{len(urls)}: {url}")
+                log_area.code("\n".join(log_lines[-LOG_TAIL_LINES:]))
+                last_flush = now
             
-            # Store the data both in the list and in the URL map
-            all_data.append(data)
-            url_data_map[url] = data
-            
-            with log_container:
-                st.success(f"✓ Successfully scraped: {data['Title'] or url}")
-        
-        except Exception as e:
-            error_data = {
-                "URL": url, 
-                "Title": "", 
-                "Status": f"Error: {str(e)}"
-            }
-            all_data.append(error_data)
-            url_data_map[url] = error_data
-            
-            with log_container:
-                st.error(f"✗ Error scraping {url}: {str(e)}")
-        
-        # Update progress
-        progress_bar.progress((i+1)/len(urls))
+            # Only move the progress bar when the whole percentage changes
+            percent = finished * 100 // len(urls)
+            if percent != last_percent:
+                progress_bar.progress(percent)
+                last_percent = percent
         
-        # Be nice to servers
-        time.sleep(1)
+        # Workers are spawned, not forked: forking Streamlit's threaded server process can deadlock them
+        pool = (ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+                if use_pool else nullcontext())
+        with pool as executor:
+            asyncio.run(scrape_pages(urls, options, executor, record_result))
     
     progress_text.text(f"Completed scraping {len(urls)} URLs")
-    return all_data, url_data_map
+
+# Write a header and rows to a worksheet strictly top to bottom, as constant_memory mode requires
+# (pandas' to_excel writes column by column, which constant_memory silently drops)
+def write_rows(worksheet, header, rows, header_format=None):
+    worksheet.write_row(0, 0, header, header_format)
+    for row_num, row in enumerate(rows, 1):
+        worksheet.write_row(row_num, 0, row)
+
+# Make a sheet name unique within the workbook (Excel compares names case-insensitively)
+def unique_sheet_name(sheet_name, used_names):
+    base = sheet_name
+    suffix = 2
+    while sheet_name.lower() in used_names:
+        tag = f"-{suffix}"
+        sheet_name = base[:31 - len(tag)] + tag
+        suffix += 1
+    used_names.add(sheet_name.lower())
+    return sheet_name
 
 # Function to create Excel file with multiple sheets
 def create_excel_with_multiple_sheets(url_data_map):
     output = io.BytesIO()
     
     try:
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # Create a summary sheet first
-            summary_data = []
-            for url, data in url_data_map.items():
-                summary_row = {
-                    "URL": url,
-                    "Title": data.get("Title", ""),
-                    "Status": data.get("Status", ""),
-                    "H1 Count": data.get("H1 Count", ""),
-                    "Links": data.get("Links", ""),
-                    "Images": data.get("Images", ""),
-                    "Online Registration": data.get("Online Registration", ""),
-                    "Fee": data.get("Fee", "")
-                }
-                summary_data.append(summary_row)
+        # constant_memory flushes each row to disk once written, so memory stays flat
+        with pd.ExcelWriter(output, engine='xlsxwriter',
+                            engine_kwargs={'options': {'constant_memory': True}}) as writer:
+            # One shared format for every header row; data cells are written unstyled
+            header_format = writer.book.add_format({'bold': True, 'border': 1})
             
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name="Summary", index=False)
+            # Create a summary sheet first, written row by row without a DataFrame
+            summary_columns = ["URL", "Title", "Status", "H1 Count", "Links", "Images", "Online Registration", "Fee"]
+            summary_rows = (
+                [url] + [data.get(column, "") for column in summary_columns[1:]]
+                for url, data in url_data_map.items()
+            )
+            write_rows(writer.book.add_worksheet("Summary"), summary_columns, summary_rows, header_format)
+            used_names = {"summary"}
             
             # Create individual sheets for each URL
             for url, data in url_data_map.items():
                 # Create a clean sheet name from the URL
-                sheet_name = clean_url_for_sheet_name(url)
+                sheet_name = unique_sheet_name(clean_url_for_sheet_name(url), used_names)
                 
-                # Convert data to dataframe 
                 # For individual URL sheets, we'll use a transposed layout for better readability
-                if "All Sections" in data:
-                    # Remove the JSON-encoded sections data
-                    data_copy = data.copy()
-                    all_sections = data_copy.pop("All Sections")
-                    
-                    # First add the basic data
-                    items = list(data_copy.items())
-                    df = pd.DataFrame(items, columns=['Field', 'Value'])
-                    
-                    # Try to add section data as separate rows
-                    try:
-                        sections = json.loads(all_sections)
-                        for section_name, content in sections.items():
-                            items.append((f"Section: {section_name}", content))
-                    except:
-                        pass  # Just continue without the section data if it can't be parsed
-                    
-                    df = pd.DataFrame(items, columns=['Field', 'Value'])
-                else:
-                    # Just use the data directly if no sections
-                    items = list(data.items())
-                    df = pd.DataFrame(items, columns=['Field', 'Value'])
+                # First add the basic data, leaving out the sections dict
+                items = [(field, value) for field, value in data.items() if field != "All Sections"]
+                
+                # Add section data as separate rows
+                for section_name, content in data.get("All Sections", {}).items():
+                    items.append((f"Section: {section_name}", content))
                 
-                # Write to excel
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                # Write the Field/Value pairs straight to the sheet
+                worksheet = writer.book.add_worksheet(sheet_name)
+                write_rows(worksheet, ['Field', 'Value'], items, header_format)
                 
                 # Adjust column widths
-                worksheet = writer.sheets[sheet_name]
                 worksheet.set_column(0, 0, 30)  # Field column
                 worksheet.set_column(1, 1, 100)  # Value column
         
@@ -420,6 +418,71 @@ def create_excel_with_multiple_sheets(url_data_map):
         st.error(f"Error creating Excel file: {str(e)}")
         return None
 
+# Sections are kept as dicts in memory and only serialised to JSON for flat exports
+def serialize_sections(df):
+    if "All Sections" not in df.columns:
+        return df
+    return df.assign(**{"All Sections": df["All Sections"].map(lambda s: orjson.dumps(s).decode(), na_action='ignore')})
+
+# Function to create Excel file with all URLs in one sheet
+def create_excel_single_sheet(df):
+    output = io.BytesIO()
+    
+    try:
+        with pd.ExcelWriter(output, engine='xlsxwriter',
+                            engine_kwargs={'options': {'constant_memory': True}}) as writer:
+            header_format = writer.book.add_format({'bold': True, 'border': 1})
+            
+            # Prepare rows in slices so only one chunk's converted copy exists at a time;
+            # missing values become None because xlsxwriter cannot write NaN
+            chunks = (serialize_sections(df.iloc[start:start + EXCEL_CHUNK_ROWS])
+                      for start in range(0, len(df), EXCEL_CHUNK_ROWS))
+            rows = (row for chunk in chunks
+                    for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None))
+            write_rows(writer.book.add_worksheet('All Data'), list(df.columns), rows, header_format)
+        
+        # Return the Excel file as bytes
+        output.seek(0)
+        return output.getvalue()
+    
+    except Exception as e:
+        st.error(f"Error creating Excel file: {str(e)}")
+        return None
+
+# Function to create a Parquet file with all URLs (one row per URL, like the CSV)
+def create_parquet(df):
+    try:
+        output = io.BytesIO()
+        serialize_sections(df).to_parquet(output, engine='pyarrow', compression='zstd', index=False)
+        return output.getvalue()
+    
+    except Exception as e:
+        st.error(f"Error creating Parquet file: {str(e)}")
+        return None
+
+# Cached builders for the results view. Streamlit reruns the whole script on every
+# interaction, so these are keyed on data_key (session token, row count and
+# last URL) and only rebuild when new rows arrive; underscore-prefixed arguments are not hashed.
+@st.cache_data(max_entries=16)
+def build_dataframe(_rows, data_key):
+    return pd.DataFrame(_rows)
+
+@st.cache_data(max_entries=16)
+def build_csv(_df, data_key):
+    return serialize_sections(_df).to_csv(index=False, lineterminator='\n').encode('utf-8')
+
+@st.cache_data(max_entries=16)
+def build_multi_sheet_excel(_url_data_map, data_key):
+    return create_excel_with_multiple_sheets(_url_data_map)
+
+@st.cache_data(max_entries=16)
+def build_single_sheet_excel(_df, data_key):
+    return create_excel_single_sheet(_df)
+
+@st.cache_data(max_entries=16)
+def build_parquet(_df, data_key):
+    return create_parquet(_df)
+
 # Scrape button
 # Optional: Resume or Reset Progress
 col_resume, col_reset = st.columns(2)
@@ -429,24 +492,45 @@ with col_resume:
 with col_reset:
     if st.button("Reset Progress"):
         st.session_state.current_index = 0
+        open(checkpoint_file, "w").close()
+        already_scraped.clear()
         st.success("Progress has been reset.")
 
 if st.button("Start Scraping"):
+    st.session_state.current_index = 0
     st.session_state.trigger_scraping = True
 
 if st.session_state.trigger_scraping:
-    urls = [url.strip() for url in url_text.split("\n") if url.strip()]
+    # Normalize each non-blank line and drop repeats, keeping the original order;
+    # a line too malformed to parse is skipped so the rest of the list still runs
+    urls = {}
+    for line in url_text.splitlines():
+        url = line.strip()
+        if not url:
+            continue
+        try:
+            urls[normalize_url(url)] = None
+        except ValueError as e:
+            st.warning(f"Skipping malformed URL {url}: {e}")
+    urls = list(urls)
     if not urls:
         st.error("No URLs provided. Please enter at least one URL.")
     else:
         st.session_state.is_scraping = True
-        for i in range(st.session_state.current_index, len(urls)):
-            url = urls[i]
-            st.session_state.current_index = i
-            new_data, new_map = scrape_urls([url])
-
-            st.session_state.scraped_data.extend(new_data)
-            st.session_state.url_data_map.update(new_map)
+        start_index = st.session_state.current_index
+        
+        # Keep each result as soon as its URL finishes, so an interrupted run loses nothing.
+        # URLs finish out of order, so the resume position only moves past a run of finished URLs;
+        # any later ones already done are skipped on resume through the checkpoint.
+        finished_positions = set()
+        def store_result(position, data):
+            st.session_state.scraped_data.append(data)
+            st.session_state.url_data_map[data["URL"]] = data
+            finished_positions.add(position)
+            while st.session_state.current_index - start_index in finished_positions:
+                st.session_state.current_index += 1
+        
+        scrape_urls(urls[start_index:], on_result=store_result)
         st.session_state.is_scraping = False
 st.session_state.trigger_scraping = False
 
@@ -454,8 +538,10 @@ st.session_state.trigger_scraping = False
 if st.session_state.scraped_data:
     st.subheader("Scraped Data")
     
-    # Create a DataFrame
-    df = pd.DataFrame(st.session_state.scraped_data)
+    # Create a DataFrame (cached until new rows arrive)
+    data_key = (st.session_state.session_token, len(st.session_state.scraped_data),
+                st.session_state.scraped_data[-1]["URL"])
+    df = build_dataframe(st.session_state.scraped_data, data_key)
     
     # Get a list of all unique column names across all URLs
     all_columns = set()
@@ -471,20 +557,11 @@ if st.session_state.scraped_data:
             
             # Try to display sections if available
             if "All Sections" in data:
-                try:
-                    sections = json.loads(data["All Sections"])
-                    for section_name, content in sections.items():
-                        with st.expander(f"{section_name}"):
-                            st.write(content)
-                except:
-                    # If we can't parse All Sections, try the individual section columns
-                    for col in section_columns:
-                        if col in data and data[col]:
-                            section_name = col.replace("Section: ", "")
-                            with st.expander(f"{section_name}"):
-                                st.write(data[col])
+                for section_name, content in data["All Sections"].items():
+                    with st.expander(f"{section_name}"):
+                        st.write(content)
     
-    # Display basic dataframe (excluding the All Sections column which is JSON)
+    # Display basic dataframe (excluding the All Sections column which holds dicts)
     display_cols = [col for col in df.columns if col != "All Sections"]
     st.dataframe(df[display_cols])
     
@@ -493,10 +570,9 @@ if st.session_state.scraped_data:
     
     with col1:
         # For CSV we'll include all data
-        csv = df.to_csv(index=False).encode('utf-8')
         st.download_button(
             "Download CSV",
-            csv,
+            build_csv(df, data_key),
             "scraped_data.csv",
             "text/csv",
             key='download-csv'
@@ -504,8 +580,27 @@ if st.session_state.scraped_data:
     
     with col2:
         # For Excel, use the appropriate export method based on user choice
-        if excel_option == "One sheet per URL":
-            excel_data = create_excel_with_multiple_sheets(st.session_state.url_data_map)
+        if excel_option == "Parquet (fastest)":
+            # Columnar and compressed; skips Excel serialization entirely
+            parquet_data = build_parquet(df, data_key)
+            if parquet_data:
+                st.download_button(
+                    "Download Parquet",
+                    parquet_data,
+                    "scraped_data.parquet",
+                    "application/octet-stream",
+                    key='download-parquet'
+                )
+        elif len(df) > EXCEL_MAX_ROWS:
+            st.download_button(
+                "Download Excel",
+                b"",
+                disabled=True,
+                help="Use CSV for large exports",
+                key='download-excel-disabled'
+            )
+        elif excel_option == "One sheet per URL":
+            excel_data = build_multi_sheet_excel(st.session_state.url_data_map, data_key)
             if excel_data:
                 st.download_button(
                     "Download Excel (Multiple Sheets)",
@@ -516,14 +611,8 @@ if st.session_state.scraped_data:
                 )
         else:
             # All in one sheet
-            try:
-                buffer = pd.ExcelWriter('scraper_results.xlsx', engine='xlsxwriter')
-                df.to_excel(buffer, index=False, sheet_name='All Data')
-                buffer.close()
-                
-                with open('scraper_results.xlsx', 'rb') as f:
-                    excel_data = f.read()
-                
+            excel_data = build_single_sheet_excel(df, data_key)
+            if excel_data:
                 st.download_button(
                     "Download Excel (Single Sheet)",
                     excel_data,
@@ -531,8 +620,6 @@ if st.session_state.scraped_data:
                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     key='download-excel-single'
                 )
-            except Exception as e:
-                st.error(f"Error creating Excel file: {str(e)}")
 
 # Add instructions at the bottom
 with st.expander("How to use this government service scraper"):
@@ -543,16 +630,17 @@ with st.expander("How to use this government service scraper"):
     2. **Configure advanced options** if needed:
        - Adjust selectors for different page structures
        - Choose what information to extract
-       - Select Excel export format (one sheet per URL or all in one sheet)
+       - Select Excel export format (one sheet per URL or all in one sheet) or Parquet
     
     3. **Click 'Start Scraping'** to begin processing the URLs
     4. **Review the extracted data**, including section content that is expanded in the results
-    5. **Download results** as CSV or Excel when complete
+    5. **Download results** as CSV, Excel or Parquet when complete
     
     ### Excel Export Options:
     
     - **One sheet per URL**: Creates a separate worksheet for each URL, with a summary sheet
     - **All URLs in one sheet**: Places all data in a single worksheet
+    - **Parquet (fastest)**: Skips Excel and downloads all data as a compressed Parquet file, one row per URL
     
     ### This scraper specializes in:
     
@@ -0,0 +1,211 @@
+# Page parsing and data extraction for the government service scraper
+# - Kept free of Streamlit so it can run in worker processes
+# - Everything here takes and returns plain, picklable values
+
+import re
+from collections import Counter, namedtuple
+from functools import lru_cache
+from bs4 import BeautifulSoup, NavigableString
+import soupsieve as sv
+
+# Extraction settings chosen in the UI, passed to worker processes
+ExtractOptions = namedtuple(
+    "ExtractOptions",
+    ["title_selector", "extract_meta", "extract_links", "extract_images", "extract_sections"]
+)
+
+# Section headings recognised on government service pages
+SECTION_TITLES = frozenset([
+    "Introduction",
+    "What you'll need?",
+    "How to get the service?",
+    "Who's eligible?",
+    "Payment / Charges",
+    "Need help?",
+    "Things to keep in mind",
+    "Required Documents",
+    "Online Registration",
+])
+
+# Extract section content (specifically for government service pages)
+def extract_section_content(soup):
+    sections = {}
+
+    # Collect headings and id'd content divs in a single pass over the tree
+    headings = []
+    divs_by_id = {}
+    for tag in soup.find_all(["h5", "div"]):
+        if tag.name == "h5":
+            headings.append(tag)
+        elif tag.has_attr("id"):
+            divs_by_id.setdefault(tag["id"], tag)
+
+    for tag in headings:
+        title = tag.get_text(strip=True).strip(":")
+        if title not in SECTION_TITLES:
+            continue
+
+        button = tag.find_parent("button")
+        if not button or not button.has_attr("data-target"):
+            continue
+
+        target_id = button["data-target"].strip("#")
+        content_div = divs_by_id.get(target_id)
+        if not content_div:
+            continue
+
+        for junk in content_div.find_all(["script", "style", "noscript"]):
+            junk.decompose()
+
+        # One get_text over the whole body; drop a leading line that repeats the title
+        raw_text = content_div.get_text(separator="\n", strip=True)
+        first_line, _, rest = raw_text.partition("\n")
+        final_content = (rest if first_line.strip() == title else raw_text).strip()
+        if final_content:
+            sections[title] = final_content
+
+    return sections
+
+# Phrases that show a service can be registered for online, matched against the raw page bytes
+ONLINE_INDICATOR_RE = re.compile(rb'register online|available online|online service|apply online', re.IGNORECASE)
+
+# Keywords that mark a list item as a required document (matched anywhere in the item, as before)
+DOCUMENT_KEYWORD_RE = re.compile(r'copy|document|certificate|id|passport', re.IGNORECASE)
+
+# Fee amount in Malaysian ringgit, e.g. "RM 25.50"
+FEE_AMOUNT_RE = re.compile(r'RM\s*(\d+(?:\.\d+)?)')
+
+# Text searches made against each page, all answered by one pass over its strings.
+# Each search is a tuple of casefolded literals matched as case-insensitive substrings.
+TEXT_SEARCHES = {
+    "eligibility": ("who's eligible",),
+    "payment": ("payment", "charges", "fee"),
+}
+
+# Walk the strings under root once and return the first match for each search
+def find_first_strings(root, searches):
+    found = {}
+    for node in root.descendants:
+        if not isinstance(node, NavigableString):
+            continue
+        text = node.casefold()
+        for name, needles in searches.items():
+            if name not in found and any(needle in text for needle in needles):
+                found[name] = node
+        if len(found) == len(searches):
+            break
+    return found
+
+# Compile CSS selectors once and reuse them across pages
+@lru_cache(maxsize=128)
+def compile_selector(selector):
+    return sv.compile(selector)
+
+# Parse one fetched page and return its extracted fields as a plain dict
+def parse_and_extract(url, page, options):
+    soup = None
+    try:
+        # Parse the raw bytes once with lxml; lxml sniffs the encoding itself
+        soup = BeautifulSoup(page, 'lxml')
+        body = soup.body or soup
+        text_matches = find_first_strings(body, TEXT_SEARCHES)
+
+        # Extract data
+        data = {"URL": url}
+
+        # Title
+        title_elem = compile_selector(options.title_selector).select_one(soup)
+        if title_elem:
+            data["Title"] = title_elem.get_text(strip=True)
+        else:
+            data["Title"] = ""
+
+        # Count H1 tags, links and images in a single traversal
+        counted_tags = ['h1']
+        if options.extract_links:
+            counted_tags.append('a')
+        if options.extract_images:
+            counted_tags.append('img')
+        tag_counts = Counter(tag.name for tag in soup.find_all(counted_tags))
+
+        data["H1 Count"] = tag_counts['h1']
+
+        # Count links
+        if options.extract_links:
+            data["Links"] = tag_counts['a']
+
+        # Count images
+        if options.extract_images:
+            data["Images"] = tag_counts['img']
+
+        # Extract meta tags
+        if options.extract_meta:
+            meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
+            if meta_keywords:
+                data["Meta Keywords"] = meta_keywords.get('content', '')
+
+            meta_desc = soup.find('meta', attrs={'name': 'description'})
+            if meta_desc:
+                data["Meta Description"] = meta_desc.get('content', '')
+
+        # Extract section content for government services
+        if options.extract_sections:
+            sections = extract_section_content(soup)
+
+            # Add sections as columns
+            for section_name, content in sections.items():
+                column_name = f"Section: {section_name}"
+                data[column_name] = content
+
+            # Keep the full sections data as a dict; it is serialised only when exported
+            data["All Sections"] = sections
+
+        # Required documents
+        documents = "\n".join(
+            text for text in (li.get_text(strip=True) for li in soup.find_all('li'))
+            if DOCUMENT_KEYWORD_RE.search(text)
+        )
+        if documents:
+            data["Required Documents"] = documents
+
+        # Eligibility
+        eligible_section = text_matches.get("eligibility")
+        parent = eligible_section.find_parent(['div', 'section']) if eligible_section else None
+        if parent:
+            eligibility = "\n".join(li.get_text(strip=True) for li in parent.find_all('li'))
+            if eligibility:
+                data["Eligibility Criteria"] = eligibility
+
+        # Check if registration is available online
+        data["Online Registration"] = "Yes" if ONLINE_INDICATOR_RE.search(page) else "No"
+
+        # Costs/fees
+        payment_section = text_matches.get("payment")
+        parent = payment_section.find_parent(['div', 'section']) if payment_section else None
+        if parent:
+            fee_text = parent.get_text(strip=True)
+            fee_lower = fee_text.lower()
+            if "free" in fee_lower or "no charge" in fee_lower:
+                data["Fee"] = "Free"
+            else:
+                # Try to extract fee amount
+                fee_match = FEE_AMOUNT_RE.search(fee_text)
+                if fee_match:
+                    data["Fee"] = f"RM {fee_match.group(1)}"
+                else:
+                    data["Fee"] = fee_text
+
+        data["Status"] = "completed"
+        return data
+
+    except Exception as e:
+        return {
+            "URL": url,
+            "Title": "",
+            "Status": f"Error: {str(e)}"
+        }
+
+    finally:
+        # Break the tree's parent/child cycles now rather than waiting for the cyclic GC
+        if soup is not None:
+            soup.decompose()